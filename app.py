@@ -1,70 +1,149 @@
 import streamlit as st
 import pickle
+from html import escape, unescape
+from urllib.parse import quote
 import numpy as np
-from difflib import get_close_matches
+import pandas as pd
+from rapidfuzz import fuzz, process, utils
 
 # -------------------
 # Load data with error handling
 # -------------------
-try:
+@st.cache_resource(show_spinner=False)
+def _load_artifacts():
+    """Unpickle the data files once per server process, not on every rerun."""
     # Load data files from their respective directories
-    pt = pickle.load(open("data/pt.pkl", "rb"))  # pivot table index = Book-Title
-    books = pickle.load(open("artifacts/books.pkl", "rb"))  # full books dataframe
-    similarity_scores = pickle.load(open("artifacts/similarity_scores.pkl", "rb"))
-    popular_df = pickle.load(open("artifacts/popular.pkl", "rb"))  # top 50 popular books (num_ratings, avg_rating, etc)
+    with open("data/pt.pkl", "rb") as f:
+        pt = pickle.load(f)  # pivot table index = Book-Title
+    with open("artifacts/books.pkl", "rb") as f:
+        books = pickle.load(f)  # full books dataframe
+    # Only pivot-table titles are ever looked up: keep one row each, with titles as a categorical
+    # sharing pt.index's vocabulary so equality and index lookups work on integer codes
+    books = books[books["Book-Title"].isin(pt.index)].drop_duplicates("Book-Title")
+    books = books.assign(**{"Book-Title": pd.Categorical(books["Book-Title"], categories=pt.index)})
+    # precomputed top-50 neighbours per title (self excluded), sorted by descending similarity
+    with np.load("artifacts/similarity_topk.npz") as topk:
+        topk_idx, topk_scores = topk["idx"], topk["scores"]
+    with open("artifacts/popular.pkl", "rb") as f:
+        popular_df = pickle.load(f)  # top 50 popular books (num_ratings, avg_rating, etc)
+    return {
+        "pt": pt,
+        "books": books,
+        "topk_idx": topk_idx,
+        "topk_scores": topk_scores,
+        "popular_df": popular_df,
+    }
+
+
+@st.cache_resource(show_spinner=False)
+def _build_lookups():
+    """Title lookups derived from the artifacts, built once instead of per query."""
+    artifacts = _load_artifacts()
+    titles = list(artifacts["pt"].index)
+    title_lower = [t.lower() for t in titles]
+    title_map = dict(zip(title_lower, titles))  # lowercase title -> title
+    title_to_idx = {t: i for i, t in enumerate(titles)}  # title -> row in pt / topk arrays
+    # fuzzy-match choices normalised once, so queries are scored without re-processing every title
+    choices = [utils.default_process(t) for t in titles]
+    # One representative author/cover per title, so recommend() can fetch all results in one reindex
+    books_by_title = artifacts["books"].set_index("Book-Title")[["Book-Author", "Image-URL-M"]]
+    return title_map, title_to_idx, choices, books_by_title
+
+
+try:
+    _artifacts = _load_artifacts()
+    pt = _artifacts["pt"]
+    topk_idx = _artifacts["topk_idx"]
+    topk_scores = _artifacts["topk_scores"]
     st.success("✅ All data files loaded successfully!")
 except FileNotFoundError as e:
     st.error(f"❌ Data file not found: {e}")
     st.error("Please make sure all required files are in the correct directories:")
     st.error("- data/pt.pkl")
     st.error("- artifacts/books.pkl")
-    st.error("- artifacts/similarity_scores.pkl")
+    st.error("- artifacts/similarity_topk.npz")
     st.error("- artifacts/popular.pkl")
     st.stop()
 except Exception as e:
     st.error(f"❌ Error loading data files: {e}")
     st.stop()
 
+_TITLE_MAP, _TITLE_TO_IDX, _CHOICES, _BOOKS_BY_TITLE = _build_lookups()
+
 # -------------------
 # Utility functions
 # -------------------
+@st.cache_data(show_spinner=False, max_entries=512)
 def recommend(book_name, n=5):
     """Return a list of dicts with recommendation info for given book_name."""
     if not book_name or not book_name.strip():
         return []
-    book_name = book_name.strip().lower()
-    title_map = {title.lower(): title for title in pt.index}
-    matches = get_close_matches(book_name, title_map.keys(), n=1, cutoff=0.55)
-    if not matches:
-        return []
+    book_name = book_name.strip()
+    if book_name in _TITLE_TO_IDX:
+        # verbatim title (e.g. from a Top 50 card): no fuzzy matching needed
+        idx = _TITLE_TO_IDX[book_name]
+    elif book_name.lower() in _TITLE_MAP:
+        idx = _TITLE_TO_IDX[_TITLE_MAP[book_name.lower()]]
+    else:
+        # rapidfuzz scores are 0-100, so 55 matches the old difflib cutoff of 0.55; the cutoff also
+        # lets rapidfuzz reject titles by length bound in C, so no Python-side prefilter is needed
+        match = process.extractOne(
+            utils.default_process(book_name), _CHOICES, scorer=fuzz.ratio, processor=None, score_cutoff=55
+        )
+        if match is None:
+            return []
+        idx = match[2]  # position in _CHOICES == row in pt / topk arrays
 
-    matched_title = title_map[matches[0]]
-    try:
-        idx = np.where(pt.index == matched_title)[0][0]
-    except IndexError:
-        return []
+    # neighbours are precomputed offline, so this is a slice rather than a scan (n is capped at 50)
+    n = max(0, min(n, topk_idx.shape[1]))
+    titles = pt.index[topk_idx[idx, :n]]
+    scores = topk_scores[idx, :n]
+    sub = _BOOKS_BY_TITLE.reindex(titles)
+    found = titles.isin(_BOOKS_BY_TITLE.index)  # skip titles with no entry in books
+    return [
+        {"title": title, "author": author, "image": image, "score": float(score)}
+        for title, (author, image), score, ok in zip(titles, sub.itertuples(index=False, name=None), scores, found)
+        if ok
+    ]
 
-    sim_scores = list(enumerate(similarity_scores[idx]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)[1 : n + 1]
-
-    recs = []
-    for i, score in sim_scores:
-        title = pt.index[i]
-        try:
-            # fetch one representative row from books
-            row = books[books["Book-Title"] == title].drop_duplicates("Book-Title").iloc[0]
-            recs.append(
-                {
-                    "title": row["Book-Title"],
-                    "author": row.get("Book-Author", "Unknown"),
-                    "image": row.get("Image-URL-M", None),
-                    "score": float(score),
-                }
-            )
-        except (IndexError, KeyError) as e:
-            # Skip this book if there's an error
-            continue
-    return recs
+
+def _html(text):
+    """Escape text for HTML; titles in the dataset already contain entities such as &amp;."""
+    return escape(unescape(str(text)))
+
+
+_PLACEHOLDER_IMG = "https://via.placeholder.com/130x180?text=No+Image"
+
+
+def _img_html(src, alt):
+    """Cover <img> tag, falling back to the placeholder when the URL is missing or fails to load."""
+    if not isinstance(src, str) or not src:
+        src = _PLACEHOLDER_IMG
+    return f"""<img src="{_html(src)}" alt="{_html(alt)}" onerror="this.src='{_PLACEHOLDER_IMG}'">"""
+
+
+@st.cache_data(show_spinner=False)
+def _top50_html():
+    """Build the Top 50 grid as one HTML string; popular_df is static, so this runs once."""
+    popular_df = _load_artifacts()["popular_df"]
+    titles = popular_df["Book-Title"].to_numpy()
+    authors = popular_df["Book-Author"].to_numpy()
+    imgs = popular_df["Image-URL-M"].to_numpy()
+    ratings = popular_df["avg_rating"].round(2).to_numpy()
+    votes = popular_df["num_ratings"].to_numpy()
+    cards = "".join(
+        f"""<div class="book-card">
+<div class="card-content">
+{_img_html(img, title)}
+<div class="book-title">{_html(title)}</div>
+<div class="book-author">by {_html(author)}</div>
+<div class="rating">⭐ {rating} | {n_votes} votes</div>
+</div>
+<a class="show-similar" href="?book={quote(title)}" target="_self" title="Show similar books to {_html(title)}">Show Similar</a>
+</div>"""
+        for title, author, img, rating, n_votes in zip(titles, authors, imgs, ratings, votes)
+    )
+    return f'<div class="book-grid">{cards}</div>'
 
 
 # -------------------
@@ -73,7 +152,7 @@ def recommend(book_name, n=5):
 st.set_page_config(page_title="Book Recommender", layout="wide")
 
 # --- Improved topbar styling with better alignment ---
-st.markdown("""
+TOPBAR_CSS = """
 <style>
 .topbar {
     background: linear-gradient(90deg, #0fa66b, #0fa66b);
@@ -131,16 +210,122 @@ st.markdown("""
     background: rgba(255,255,255,0.3) !important;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# Render the actual topbar
-st.markdown("""
+# The actual topbar
+TOPBAR_HTML = """
 <div class="topbar">
     <div class="brand">📚 My Book Recommender</div>
     <div class="search-container">
         </div>
 </div>
-""", unsafe_allow_html=True)
+"""
+
+# Style for improved book cards with better alignment and responsive design
+CARD_STYLE = """
+<style>
+    .book-card {
+        border: 1px solid #e0e0e0;
+        border-radius: 12px;
+        padding: 12px;
+        text-align: center;
+        background: #fff;
+        margin-bottom: 20px;
+        height: 340px;
+        display: flex;
+        flex-direction: column;
+        justify-content: space-between;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+        transition: all 0.3s ease;
+        position: relative;
+        overflow: hidden;
+    }
+    .book-card:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 4px 16px rgba(0,0,0,0.15);
+    }
+    .book-card img {
+        width: 130px;
+        height: 180px;
+        object-fit: cover;
+        border-radius: 8px;
+        margin: 0 auto 8px auto;
+        border: 2px solid #f0f0f0;
+    }
+    .book-title {
+        font-weight: 600;
+        margin: 6px 0 4px 0;
+        font-size: 13px;
+        line-height: 1.3;
+        height: 42px;
+        overflow: hidden;
+        display: -webkit-box;
+        -webkit-line-clamp: 3;
+        -webkit-box-orient: vertical;
+        color: #333;
+    }
+    .book-author {
+        color: #666;
+        font-size: 11px;
+        margin: 0 0 6px 0;
+        font-style: italic;
+    }
+    .rating {
+        margin: 4px 0;
+        font-size: 12px;
+        color: #0fa66b;
+        font-weight: 500;
+    }
+    .book-grid {
+        display: grid;
+        grid-template-columns: repeat(5, minmax(0, 1fr));
+        gap: 16px;
+    }
+    .show-similar {
+        display: block;
+        margin-top: 8px;
+        background: linear-gradient(90deg, #0fa66b, #0fa66b);
+        color: white !important;
+        text-decoration: none !important;
+        border-radius: 6px;
+        padding: 6px 12px;
+        font-size: 11px;
+        font-weight: 500;
+        cursor: pointer;
+        transition: all 0.2s ease;
+    }
+    .show-similar:hover {
+        opacity: 0.9;
+        transform: translateY(-1px);
+    }
+    @media (max-width: 768px) {
+        .book-grid {
+            grid-template-columns: repeat(2, minmax(0, 1fr));
+        }
+        .book-card {
+            height: 320px;
+            padding: 8px;
+        }
+        .book-card img {
+            width: 110px;
+            height: 150px;
+        }
+        .book-title {
+            font-size: 12px;
+            height: 36px;
+        }
+    }
+</style>
+"""
+
+
+@st.cache_data(show_spinner=False)
+def _static_css():
+    """All static styling and the topbar as one string, so it is sent in a single call."""
+    return TOPBAR_CSS + TOPBAR_HTML + CARD_STYLE
+
+
+st.markdown(_static_css(), unsafe_allow_html=True)
 
 
 # -------------------
@@ -149,6 +334,10 @@ st.markdown("""
 if "selected_book" not in st.session_state:
     st.session_state.selected_book = None
 
+# "Show Similar" links on the Top 50 cards navigate to ?book=<title>
+if "book" in st.query_params:
+    st.session_state.selected_book = st.query_params.pop("book")
+
 # -------------------
 # Search & Recommendation area (top)
 # -------------------
@@ -194,13 +383,18 @@ with top_container:
         if not recs:
             st.info("No matches found — try a different title or choose from Top 50 below.")
         else:
-            cols = st.columns(5)
-            for i, book in enumerate(recs):
-                with cols[i % 5]:
-                    if book["image"]:
-                        st.image(book["image"], width=140)
-                    st.markdown(f"**{book['title']}**")
-                    st.caption(f"by {book['author']}")
+            # One HTML row for all recommendations instead of image/markdown/caption calls per column
+            cards = "".join(
+                f"""<div class="book-card">
+<div class="card-content">
+{_img_html(book["image"], book["title"])}
+<div class="book-title">{_html(book["title"])}</div>
+<div class="book-author">by {_html(book["author"])}</div>
+</div>
+</div>"""
+                for book in recs
+            )
+            st.markdown(f'<div class="book-grid">{cards}</div>', unsafe_allow_html=True)
     else:
         st.info("Search a book or click 'Show Similar' on any Top 50 book below to see similar reads here.")
 
@@ -211,127 +405,5 @@ st.write("---")
 # Top 50 Grid with Perfect Alignment
 # -------------------
 st.markdown("## 📈 Top 50 Books")
-grid_container = st.container()
 
-# Style for improved book cards with better alignment and responsive design
-card_style = """
-    <style>
-        .book-card {
-            border: 1px solid #e0e0e0;
-            border-radius: 12px;
-            padding: 12px;
-            text-align: center;
-            background: #fff;
-            margin-bottom: 20px;
-            height: 340px;
-            display: flex;
-            flex-direction: column;
-            justify-content: space-between;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-            transition: all 0.3s ease;
-            position: relative;
-            overflow: hidden;
-        }
-        .book-card:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 4px 16px rgba(0,0,0,0.15);
-        }
-        .book-card img {
-            width: 130px;
-            height: 180px;
-            object-fit: cover;
-            border-radius: 8px;
-            margin: 0 auto 8px auto;
-            border: 2px solid #f0f0f0;
-        }
-        .book-title {
-            font-weight: 600;
-            margin: 6px 0 4px 0;
-            font-size: 13px;
-            line-height: 1.3;
-            height: 42px;
-            overflow: hidden;
-            display: -webkit-box;
-            -webkit-line-clamp: 3;
-            -webkit-box-orient: vertical;
-            color: #333;
-        }
-        .book-author {
-            color: #666;
-            font-size: 11px;
-            margin: 0 0 6px 0;
-            font-style: italic;
-        }
-        .rating {
-            margin: 4px 0;
-            font-size: 12px;
-            color: #0fa66b;
-            font-weight: 500;
-        }
-        .book-card .stButton {
-            margin-top: 8px;
-        }
-        .book-card .stButton > button {
-            background: linear-gradient(90deg, #0fa66b, #0fa66b);
-            color: white;
-            border: none;
-            border-radius: 6px;
-            padding: 6px 12px;
-            font-size: 11px;
-            font-weight: 500;
-            cursor: pointer;
-            transition: all 0.2s ease;
-            width: 100%;
-        }
-        .book-card .stButton > button:hover {
-            opacity: 0.9;
-            transform: translateY(-1px);
-        }
-        @media (max-width: 768px) {
-            .book-card {
-                height: 320px;
-                padding: 8px;
-            }
-            .book-card img {
-                width: 110px;
-                height: 150px;
-            }
-            .book-title {
-                font-size: 12px;
-                height: 36px;
-            }
-        }
-    </style>
-"""
-st.markdown(card_style, unsafe_allow_html=True)
-
-cols = st.columns(5)
-for idx, row in popular_df.reset_index(drop=True).iterrows():
-    col = cols[idx % 5]
-    with col:
-        st.markdown(
-            f"""
-            <div class="book-card">
-                <div class="card-content">
-                    <img src="{row['Image-URL-M']}" alt="{row['Book-Title']}" onerror="this.src='https://via.placeholder.com/130x180?text=No+Image'">
-                    <div class="book-title">{row['Book-Title']}</div>
-                    <div class="book-author">by {row['Book-Author']}</div>
-                    <div class="rating">⭐ {round(row['avg_rating'],2)} | {row['num_ratings']} votes</div>
-                </div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-        if st.button("Show Similar", key=f"top_rec_{idx}", help=f"Show similar books to {row['Book-Title']}"):
-            st.session_state.selected_book = row['Book-Title']
-            st.rerun()
-
-
-# -------------------
-# Show recommendations if book clicked
-# -------------------
-if "book" in st.query_params:
-    st.subheader(f"📚 Recommendations for: {st.query_params['book']}")
-    recs = recommend(st.query_params['book'])
-    for book in recs:
-        st.write(f"✅ {book}")
\ No newline at end of file
+st.markdown(_top50_html(), unsafe_allow_html=True)